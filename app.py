@@ -1,5 +1,6 @@
-from flask import Flask, request, jsonify
+from flask import Flask, request, jsonify, g
 import re
+import math
 import requests
 import json
 from bs4 import BeautifulSoup
@@ -9,6 +10,11 @@ from newspaper.article import ArticleException
 from extractors.ner import extract_enitites
 from extractors.classifications import text_classification
 from extractors.summarization import summarize_arabic
+from extractors.datalayer import extract_datalayer_from_url
+from extractors.fetch import fetch_html, body_closed
+from extractors.deadline import (Deadline, DeadlineExceeded, DEADLINE_HEADER, DEFAULT_TIMEOUT,
+                                 set_deadline, get_deadline)
+from entity_store import upsert_article, lookup_entity, top_entities
 from functools import lru_cache  # For caching
 import logging
 
@@ -20,24 +26,99 @@ session = requests.Session()
 
 app = Flask(__name__)
 
-@lru_cache(maxsize=128)  # Cache results of frequently accessed URLs
+# Time budget in seconds per route; DEADLINE_HEADER can only shorten it
+ROUTE_TIMEOUTS = {
+    'wams': 20,
+    'ner': 15,
+    'classification': 15,
+    'extract_text': 10,
+    'extract_datalayer': 10,
+    'extract_links': 10,
+}
+
+@app.before_request
+def start_deadline():
+    """Give every request a deadline that the fetch and model stages can see."""
+    seconds = ROUTE_TIMEOUTS.get(request.endpoint, DEFAULT_TIMEOUT)
+    header = request.headers.get(DEADLINE_HEADER)
+    if header:
+        try:
+            requested = float(header)
+        except ValueError:
+            requested = math.nan
+        if not math.isfinite(requested) or requested <= 0:
+            return jsonify({'error': f'{DEADLINE_HEADER} must be a positive number of seconds'}), 400
+        # Clients can ask for less time than the route default, never more
+        seconds = min(requested, seconds)
+    g.deadline = Deadline(seconds)
+    set_deadline(g.deadline)
+
+@app.teardown_request
+def clear_deadline(exc):
+    set_deadline(None)
+
+def timeout_response(stage, marker):
+    """Return a 504 carrying the per-stage timeout marker."""
+    return jsonify({'error': f'Deadline exceeded during {stage}', 'timeouts': {stage: marker}}), 504
+
+def error_response(result):
+    """Return the error dict of a failed stage, as a 504 when the deadline cut it short."""
+    return jsonify(result), 504 if 'timeouts' in result else 500
+
+class ParseSkipped(Exception):
+    """Raised when too little of the deadline is left to parse a fetched article."""
+
+def update_url(url):
+    """Update URL domain if necessary."""
+    pattern = r'^(https?://)(www\.)?misbar\.com(/.*)?$'
+    if url and re.match(pattern, url):
+        return re.sub(r'^(https?://)(www\.)?misbar\.com', r'\1seo.misbar.com', url)
+    return url
+
 def fetch_url_content(url):
-    """Fetch the content of a URL and return both the text and soup object."""
+    """Fetch the HTML of a URL, streamed and capped at extractors.fetch.MAX_BYTES."""
     try:
-        response = session.get(url)
-        response.raise_for_status()  # Raises an error if the request was unsuccessful
-        return response.text
+        return fetch_html(url, session=session, until=body_closed)
+    except DeadlineExceeded as e:
+        logging.warning(f"Request timed out: {e}")
+        return {"error": f"Request timed out: {e}", "timeouts": {"fetch": "cancelled"}}
     except RequestException as e:
         logging.error(f"Request failed: {e}")
         return {"error": f"Request failed: {e}"}
 
+def store_article(url, **fields):
+    """Persist a route's results in the entity store without failing the request."""
+    try:
+        upsert_article(url, **fields)
+    except Exception as e:
+        logging.error(f"Failed to store results for {url}: {e}")
+
+# Cache the extracted text of frequently accessed URLs rather than their HTML,
+# which can be up to MAX_BYTES per page
+@lru_cache(maxsize=128)
+def cached_article_text(url):
+    """Fetch and parse an article, raising on failure so that failures are not cached."""
+    html = fetch_html(url, session=session, until=body_closed)
+    deadline = get_deadline()
+    if deadline is not None and not deadline.allows('parse'):
+        raise ParseSkipped()
+    article = Article(url)
+    article.download(input_html=html)
+    article.parse()
+    return article.text
+
 def extract_article_text(url):
     """Extract the main text of an article from the given URL."""
     try:
-        article = Article(url)
-        article.download()
-        article.parse()
-        return article.text
+        return cached_article_text(url)
+    except DeadlineExceeded as e:
+        logging.warning(f"Request timed out: {e}")
+        return {"error": f"Request timed out: {e}", "timeouts": {"fetch": "cancelled"}}
+    except ParseSkipped:
+        return {"error": "Deadline exceeded before parsing", "timeouts": {"parse": "skipped"}}
+    except RequestException as e:
+        logging.error(f"Request failed: {e}")
+        return {"error": f"Request failed: {e}"}
     except ArticleException as e:
         logging.error(f"Article extraction failed: {e}")
         return {"error": str(e)}
@@ -76,24 +157,35 @@ def wams():
     response = {}
     article_text = extract_article_text(url)
 
-    if 'error' in article_text:
-        return jsonify(article_text), 500
+    if isinstance(article_text, dict):
+        return error_response(article_text)
+
+    # NER cannot be interrupted once started, so it is skipped when too little time is
+    # left and the article text that did finish is returned instead
+    if not g.deadline.allows('ner'):
+        return jsonify({'text': article_text, 'timeouts': {'ner': 'skipped'}})
 
     entities = extract_enitites(article_text)
     response['entities'] = entities
 
+    store_article(url, entities=entities)
+
     return jsonify(response)
 
 @app.route('/ner', methods=['POST'])
 def ner():
     data = request.get_json()
-    url = data.get('url')
-    update_url(url)
+    url = update_url(data.get('url'))
     if not url:
         return jsonify({'error': 'URL is required'}), 400
     try:
         article_text = extract_article_text(url)
+        if isinstance(article_text, dict):
+            return error_response(article_text)
+        if not g.deadline.allows('ner'):
+            return timeout_response('ner', 'skipped')
         entities = extract_enitites(article_text)
+        store_article(url, entities=entities)
         return jsonify({'entities': entities})
     except Exception as e:
         return jsonify({'error': str(e)}), 500
@@ -109,8 +201,16 @@ def classification():
     try:
         # Placeholder functions for extracting article text and updating URL
         article_text = extract_article_text(url)
-        results = text_classification([article_text])
-        
+        if isinstance(article_text, dict):
+            return error_response(article_text)
+        if not g.deadline.allows('classification'):
+            return timeout_response('classification', 'skipped')
+        results = text_classification([article_text], max_time=g.deadline.remaining())
+        if g.deadline.expired():
+            # Generation was stopped by max_time, so the label cannot be trusted
+            return timeout_response('classification', 'cancelled')
+
+        store_article(url, classification=results)
         return jsonify(results)
     except Exception as e:
         return jsonify({'error': str(e)}), 500
@@ -118,12 +218,13 @@ def classification():
 @app.route('/extract_text', methods=['POST'])
 def extract_text():
     data = request.json
-    url = data.get('url')
-    url = update_url(url)
+    url = update_url(data.get('url'))
     if not url:
         return jsonify({'error': 'URL is required'}), 400
     try:
         text = extract_article_text(url)
+        if isinstance(text, dict):
+            return error_response(text)
         if text:
             return jsonify({'text': text})
         else:
@@ -134,13 +235,17 @@ def extract_text():
 @app.route('/extract_datalayer', methods=['POST'])
 def extract_datalayer():
     data = request.json
-    url = data.get('url')
-    update_url(url)
+    url = update_url(data.get('url'))
     if not url:
         return jsonify({'error': 'URL is required'}), 400
     try:
         datalayer = extract_datalayer_from_url(url)
+        # Rejected or failed downloads and unparseable dataLayers all come back as
+        # an error dict, which must not be reported as a found dataLayer
+        if isinstance(datalayer, dict) and 'error' in datalayer:
+            return error_response(datalayer)
         if datalayer:
+            store_article(url, datalayer=datalayer)
             return jsonify({'datalayer': datalayer})
         else:
             return jsonify({'error': 'dataLayer not found'}), 404
@@ -151,17 +256,69 @@ def extract_datalayer():
 @app.route('/extract_links', methods=['POST'])
 def extract_links():
     data = request.json
-    url = data.get('url')
-    url = update_url(url)
+    url = update_url(data.get('url'))
 
     if not url:
         return jsonify({'error': 'URL is required'}), 400
 
     try:
-        links = extract_external_links(url)
+        html = fetch_url_content(url)
+        if isinstance(html, dict):
+            return error_response(html)
+        links = extract_external_links(BeautifulSoup(html, 'html.parser'))
         return jsonify({'external_links': links})
     except Exception as e:
         return jsonify({'error': str(e)}), 500
 
+def parse_since(data):
+    """Return the optional 'since' unix timestamp, or raise ValueError if it is not one."""
+    since = data.get('since')
+    if since is None:
+        return None
+    if isinstance(since, bool):
+        raise ValueError(since)
+    since = float(since)
+    if not math.isfinite(since):
+        raise ValueError(since)
+    return since
+
+@app.route('/entities/lookup', methods=['POST'])
+def entities_lookup():
+    data = request.get_json()
+    text = data.get('text')
+    if not text:
+        return jsonify({'error': 'text is required'}), 400
+    try:
+        limit = int(data.get('limit', 100))
+    except (TypeError, ValueError):
+        return jsonify({'error': 'limit must be an integer'}), 400
+    try:
+        since = parse_since(data)
+    except (TypeError, ValueError):
+        return jsonify({'error': 'since must be a unix timestamp in seconds'}), 400
+    try:
+        articles = lookup_entity(text, entity_type=data.get('type'), since=since, limit=limit)
+        return jsonify({'articles': articles})
+    except Exception as e:
+        return jsonify({'error': str(e)}), 500
+
+@app.route('/entities/top', methods=['POST'])
+def entities_top():
+    data = request.get_json() or {}
+    try:
+        k = int(data.get('k', 10))
+    except (TypeError, ValueError):
+        return jsonify({'error': 'k must be an integer'}), 400
+    try:
+        since = parse_since(data)
+    except (TypeError, ValueError):
+        return jsonify({'error': 'since must be a unix timestamp in seconds'}), 400
+    try:
+        entities = top_entities(entity_type=data.get('type'), category=data.get('category'),
+                                since=since, k=k)
+        return jsonify({'entities': entities})
+    except Exception as e:
+        return jsonify({'error': str(e)}), 500
+
 if __name__ == '__main__':
     app.run(host='0.0.0.0', port=5000, debug=False)  # Set debug to False for production
@@ -0,0 +1,93 @@
+"""Report per-request peak memory of the fetch path.
+
+Serves synthetic pages from a local HTTP server and compares reading the whole
+body with requests against the streaming fetch in extractors.fetch.
+
+    python -m benchmarks.bench_fetch_memory
+"""
+import threading
+import time
+import tracemalloc
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+import requests
+from requests.exceptions import RequestException
+from extractors.fetch import fetch_html, body_closed, datalayer_seen
+
+ARTICLE = (
+    "<html><head><script>dataLayer.push({'section': 'news', 'id': 1});</script></head>"
+    "<body><article>" + "<p>نص المقال</p>" * 2000 + "</article></body></html>"
+)
+# Article followed by 4MB of trailing markup after </body>, under the byte cap
+PADDED_ARTICLE = ARTICLE + "<!-- padding -->" * 250_000
+# 50MB page, larger than the default byte cap
+LARGE_PAGE = "<html><body>" + "x" * (50 * 1024 * 1024) + "</body></html>"
+BINARY = b"\0" * (20 * 1024 * 1024)
+
+PAGES = {
+    "/article": ("text/html; charset=utf-8", ARTICLE.encode("utf-8")),
+    "/padded": ("text/html; charset=utf-8", PADDED_ARTICLE.encode("utf-8")),
+    "/large": ("text/html; charset=utf-8", LARGE_PAGE.encode("utf-8")),
+    "/binary": ("application/octet-stream", BINARY),
+}
+
+
+class Handler(BaseHTTPRequestHandler):
+    def do_GET(self):
+        content_type, body = PAGES[self.path]
+        self.send_response(200)
+        self.send_header("Content-Type", content_type)
+        self.send_header("Content-Length", str(len(body)))
+        self.end_headers()
+        try:
+            self.wfile.write(body)
+        except (BrokenPipeError, ConnectionResetError):
+            pass  # The client stopped reading early
+
+    def log_message(self, format, *args):
+        pass
+
+
+def measure(fetch):
+    """Run fetch() and return (outcome, peak MiB, seconds)."""
+    tracemalloc.start()
+    started = time.perf_counter()
+    try:
+        outcome = f"{len(fetch())} chars"
+    except RequestException as e:
+        outcome = f"rejected: {e}"
+    elapsed = time.perf_counter() - started
+    _, peak = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+    return outcome, peak / (1024 * 1024), elapsed
+
+
+def full_body(url):
+    response = requests.get(url)
+    response.raise_for_status()
+    return response.text
+
+
+def main():
+    server = ThreadingHTTPServer(("127.0.0.1", 0), Handler)
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    base = f"http://127.0.0.1:{server.server_address[1]}"
+
+    cases = [
+        ("full body", lambda path: full_body(base + path)),
+        ("streamed", lambda path: fetch_html(base + path)),
+        ("streamed, until body", lambda path: fetch_html(base + path, until=body_closed)),
+        ("streamed, until dataLayer", lambda path: fetch_html(base + path, until=datalayer_seen)),
+    ]
+
+    print(f"{'page':<10} {'fetch':<28} {'peak MiB':>9} {'seconds':>8}  outcome")
+    for path in PAGES:
+        for name, fetch in cases:
+            outcome, peak, elapsed = measure(lambda: fetch(path))
+            print(f"{path:<10} {name:<28} {peak:>9.1f} {elapsed:>8.3f}  {outcome[:60]}")
+
+    server.shutdown()
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,328 @@
+import argparse
+import gzip
+import io
+import json
+import logging
+import os
+import time
+import xml.etree.ElementTree as ET
+from concurrent.futures import ThreadPoolExecutor
+
+import requests
+from bs4 import BeautifulSoup
+from requests.exceptions import RequestException, HTTPError
+from newspaper import Article
+from newspaper.article import ArticleException
+from extractors.ner import extract_entities_batch
+from extractors.classifications import text_classification
+from extractors.datalayer import extract_datalayer_from_soup
+from extractors.external_links import extract_links_from_soup
+from extractors.fetch import fetch_html as stream_html, body_closed, ContentRejected
+from entity_store import upsert_article
+
+# Configure logging
+logging.basicConfig(level=logging.INFO)
+
+# Create a session for connection pooling
+session = requests.Session()
+
+CHECKPOINT_FILE = "checkpoint.json"
+BATCH_SIZE = 16
+FETCH_WORKERS = 8
+SHARD_SIZE = 1000
+FEED_TIMEOUT = 30
+# Sitemaps are limited to 50MB uncompressed by the sitemap protocol
+FEED_MAX_BYTES = 50 * 1024 * 1024
+# Errors that make one feed unreadable without stopping the crawl; OSError and
+# EOFError cover corrupt .xml.gz sitemaps
+FEED_ERRORS = (RequestException, ET.ParseError, OSError, EOFError)
+# 4xx responses that may succeed on a later run
+TRANSIENT_STATUS_CODES = (408, 425, 429)
+
+
+def local_name(tag):
+    """Strip the XML namespace from a tag name."""
+    return tag.rsplit('}', 1)[-1]
+
+
+def child_text(element, name):
+    """Return the text of the first child with the given local name."""
+    for child in element:
+        if local_name(child.tag) == name:
+            return (child.text or "").strip()
+    return None
+
+
+def download_feed(feed_url):
+    """Download a feed with a timeout and size cap, gunzipping .xml.gz sitemaps."""
+    with session.get(feed_url, stream=True, timeout=FEED_TIMEOUT) as response:
+        response.raise_for_status()
+        content = bytearray()
+        for chunk in response.iter_content(chunk_size=64 * 1024):
+            content += chunk
+            if len(content) > FEED_MAX_BYTES:
+                raise ContentRejected(f"Feed exceeded {FEED_MAX_BYTES} bytes: {feed_url}")
+
+    content = bytes(content)
+    if content[:2] == b"\x1f\x8b":
+        with gzip.GzipFile(fileobj=io.BytesIO(content)) as f:
+            content = f.read(FEED_MAX_BYTES + 1)
+        if len(content) > FEED_MAX_BYTES:
+            raise ContentRejected(f"Feed exceeded {FEED_MAX_BYTES} bytes once decompressed: {feed_url}")
+    return content
+
+
+def read_feed(feed_url, visited=None):
+    """Return (url, lastmod) pairs listed in a sitemap, sitemap index or RSS/Atom feed.
+
+    A child sitemap that cannot be read is logged and skipped, so the rest of
+    the index is still crawled, and each sitemap is read at most once.
+    """
+    visited = set() if visited is None else visited
+    if feed_url in visited:
+        logging.warning(f"Skipping sitemap already read: {feed_url}")
+        return []
+    visited.add(feed_url)
+
+    root = ET.fromstring(download_feed(feed_url))
+    root_name = local_name(root.tag)
+
+    entries = []
+    if root_name == 'sitemapindex':
+        for sitemap in root:
+            loc = child_text(sitemap, 'loc')
+            if not loc:
+                continue
+            try:
+                entries.extend(read_feed(loc, visited))
+            except FEED_ERRORS as e:
+                logging.error(f"Failed to read sitemap {loc}: {e}")
+    elif root_name == 'urlset':
+        for url in root:
+            loc = child_text(url, 'loc')
+            if loc:
+                entries.append((loc, child_text(url, 'lastmod')))
+    elif root_name == 'rss':
+        for item in root.iter('item'):
+            link = child_text(item, 'link')
+            if link:
+                entries.append((link, child_text(item, 'pubDate')))
+    elif root_name == 'feed':
+        for entry in root:
+            if local_name(entry.tag) != 'entry':
+                continue
+            for child in entry:
+                if local_name(child.tag) == 'link' and child.get('href'):
+                    entries.append((child.get('href'), child_text(entry, 'updated')))
+                    break
+    else:
+        logging.warning(f"Unsupported feed format '{root_name}' at {feed_url}")
+    return entries
+
+
+def load_checkpoint(path):
+    """Load the map of seen URLs to their lastmod value."""
+    if not os.path.exists(path):
+        return {}
+    with open(path, encoding='utf-8') as f:
+        return json.load(f)
+
+
+def save_checkpoint(path, seen):
+    """Write the checkpoint atomically so a crash never leaves it half written."""
+    tmp_path = path + ".tmp"
+    with open(tmp_path, 'w', encoding='utf-8') as f:
+        json.dump(seen, f, ensure_ascii=False)
+    os.replace(tmp_path, path)
+
+
+def pending_entries(entries, seen):
+    """Keep only URLs that are new or whose lastmod changed since the last run."""
+    pending = {}
+    for url, lastmod in entries:
+        if url not in seen or seen[url] != lastmod:
+            pending[url] = lastmod
+    return list(pending.items())
+
+
+def is_permanent(error):
+    """Whether fetching the page again without a new lastmod would fail the same way."""
+    if isinstance(error, ContentRejected):
+        return True
+    if isinstance(error, HTTPError) and error.response is not None:
+        status = error.response.status_code
+        return 400 <= status < 500 and status not in TRANSIENT_STATUS_CODES
+    return False
+
+
+def fetch_html(url):
+    """Fetch the raw HTML of a URL."""
+    try:
+        return stream_html(url, session=session, until=body_closed)
+    except RequestException as e:
+        logging.error(f"Request failed: {e}")
+        return {"error": f"Request failed: {e}", "permanent": is_permanent(e)}
+
+
+def parse_article(url, html):
+    """Parse the fetched HTML with newspaper and the soup based extractors."""
+    try:
+        article = Article(url)
+        article.download(input_html=html)
+        article.parse()
+    except ArticleException as e:
+        logging.error(f"Article extraction failed: {e}")
+        # newspaper would fail the same way on the same HTML
+        return {"url": url, "error": str(e), "permanent": True}
+
+    soup = BeautifulSoup(html, 'html.parser')
+    return {
+        "url": url,
+        "title": article.title,
+        "text": article.text,
+        "top_image": article.top_image,
+        "external_links": extract_links_from_soup(soup),
+        "datalayer": extract_datalayer_from_soup(soup),
+    }
+
+
+def needs_retry(record):
+    """Whether a stage failed for a reason that may go away, so the URL must be retried.
+
+    Permanent failures (4xx, rejected content, unparseable pages) are checkpointed
+    like successes and only retried once their lastmod changes.
+    """
+    if record.get("permanent"):
+        return False
+    return any(key == "error" or key.endswith("_error") for key in record)
+
+
+def process_batch(batch, executor):
+    """Fetch a batch of URLs in parallel and run NER and classification on it in one pass each."""
+    urls = [url for url, _ in batch]
+    pages = list(executor.map(fetch_html, urls))
+
+    records = []
+    for (url, lastmod), html in zip(batch, pages):
+        if isinstance(html, dict):
+            record = {"url": url, **html}
+        else:
+            record = parse_article(url, html)
+        record["lastmod"] = lastmod
+        records.append(record)
+
+    parsed = [record for record in records if record.get("text")]
+    if parsed:
+        texts = [record["text"] for record in parsed]
+        try:
+            for record, entities in zip(parsed, extract_entities_batch(texts)):
+                record["entities"] = entities
+        except Exception as e:
+            for record in parsed:
+                record["ner_error"] = str(e)
+        try:
+            # Same shape as the /classification response for a single text
+            for record, classification in zip(parsed, text_classification(texts)):
+                record["classification"] = [classification]
+        except Exception as e:
+            for record in parsed:
+                record["classification_error"] = str(e)
+
+    return records
+
+
+def next_shard_index(output_dir):
+    """Continue shard numbering after the shards written by previous runs."""
+    indexes = [
+        int(name[len("shard-"):-len(".jsonl.gz")])
+        for name in os.listdir(output_dir)
+        if name.startswith("shard-") and name.endswith(".jsonl.gz")
+    ]
+    return max(indexes) + 1 if indexes else 0
+
+
+class ShardWriter:
+    """Append records to gzip compressed JSONL shards of at most shard_size lines.
+
+    Every call to write() appends a complete gzip member and closes the file, so
+    shards stay readable when the crawl is interrupted between batches.
+    """
+
+    def __init__(self, output_dir, shard_size=SHARD_SIZE):
+        self.output_dir = output_dir
+        self.shard_size = shard_size
+        self.index = next_shard_index(output_dir)
+        self.count = 0
+
+    def write(self, records):
+        while records:
+            if self.count >= self.shard_size:
+                self.index += 1
+                self.count = 0
+            chunk = records[:self.shard_size - self.count]
+            records = records[len(chunk):]
+            path = os.path.join(self.output_dir, f"shard-{self.index:05d}.jsonl.gz")
+            with gzip.open(path, 'at', encoding='utf-8') as f:
+                for record in chunk:
+                    f.write(json.dumps(record, ensure_ascii=False) + "\n")
+            self.count += len(chunk)
+
+
+def crawl(feed_urls, output_dir, checkpoint_path=None, batch_size=BATCH_SIZE,
+          workers=FETCH_WORKERS, shard_size=SHARD_SIZE):
+    """Process new or changed articles from the given feeds and return the number processed."""
+    os.makedirs(output_dir, exist_ok=True)
+    checkpoint_path = checkpoint_path or os.path.join(output_dir, CHECKPOINT_FILE)
+    seen = load_checkpoint(checkpoint_path)
+
+    entries = []
+    for feed_url in feed_urls:
+        try:
+            entries.extend(read_feed(feed_url))
+        except FEED_ERRORS as e:
+            logging.error(f"Failed to read feed {feed_url}: {e}")
+
+    pending = pending_entries(entries, seen)
+    logging.info(f"{len(entries)} URLs listed, {len(pending)} new or changed")
+
+    writer = ShardWriter(output_dir, shard_size)
+    processed = 0
+    started = time.monotonic()
+    with ThreadPoolExecutor(max_workers=workers) as executor:
+        for start in range(0, len(pending), batch_size):
+            batch = pending[start:start + batch_size]
+            records = process_batch(batch, executor)
+            writer.write(records)
+            for record in records:
+                if "error" not in record:
+                    upsert_article(record["url"], entities=record.get("entities"),
+                                   classification=record.get("classification"),
+                                   datalayer=record.get("datalayer"), title=record.get("title"),
+                                   lastmod=record.get("lastmod"))
+
+            # Only mark URLs as seen once their records are written, and never after a
+            # transient failure, since an unchanged lastmod would skip them for good
+            for record in records:
+                if not needs_retry(record):
+                    seen[record["url"]] = record["lastmod"]
+            save_checkpoint(checkpoint_path, seen)
+
+            processed += len(records)
+            elapsed = time.monotonic() - started
+            rate = processed / elapsed if elapsed else 0.0
+            logging.info(f"Processed {processed}/{len(pending)} articles ({rate:.2f} articles/s)")
+
+    return processed
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description="Crawl sitemaps or RSS feeds and extract new or changed articles.")
+    parser.add_argument('feeds', nargs='+', help="Sitemap, sitemap index or RSS/Atom feed URLs")
+    parser.add_argument('--output', default='crawl_output', help="Directory for the JSONL shards")
+    parser.add_argument('--checkpoint', help="Checkpoint file (defaults to <output>/checkpoint.json)")
+    parser.add_argument('--batch-size', type=int, default=BATCH_SIZE)
+    parser.add_argument('--workers', type=int, default=FETCH_WORKERS)
+    parser.add_argument('--shard-size', type=int, default=SHARD_SIZE)
+    args = parser.parse_args()
+
+    crawl(args.feeds, args.output, args.checkpoint, args.batch_size, args.workers, args.shard_size)
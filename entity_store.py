@@ -0,0 +1,272 @@
+import json
+import os
+import sqlite3
+import threading
+import time
+
+from camel_tools.utils.dediac import dediac_ar
+from camel_tools.utils.normalize import normalize_alef_ar
+
+DB_PATH = os.environ.get("WAMS_ENTITY_DB", "entities.db")
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS articles (
+    id INTEGER PRIMARY KEY,
+    url TEXT NOT NULL UNIQUE,
+    title TEXT,
+    category_label TEXT,
+    category_number INTEGER,
+    datalayer TEXT,
+    lastmod TEXT,
+    processed_at REAL NOT NULL
+);
+CREATE INDEX IF NOT EXISTS articles_processed_at ON articles (processed_at);
+CREATE INDEX IF NOT EXISTS articles_category ON articles (category_label, processed_at);
+
+CREATE TABLE IF NOT EXISTS entities (
+    article_id INTEGER NOT NULL REFERENCES articles (id) ON DELETE CASCADE,
+    norm_text TEXT NOT NULL,
+    type TEXT NOT NULL,
+    text TEXT NOT NULL,
+    count INTEGER NOT NULL,
+    PRIMARY KEY (norm_text, type, article_id)
+) WITHOUT ROWID;
+CREATE INDEX IF NOT EXISTS entities_article ON entities (article_id);
+
+CREATE TABLE IF NOT EXISTS entity_totals (
+    category_label TEXT NOT NULL,
+    norm_text TEXT NOT NULL,
+    type TEXT NOT NULL,
+    text TEXT NOT NULL,
+    mentions INTEGER NOT NULL,
+    articles INTEGER NOT NULL,
+    PRIMARY KEY (category_label, type, norm_text)
+) WITHOUT ROWID;
+CREATE INDEX IF NOT EXISTS entity_totals_top ON entity_totals (category_label, mentions);
+CREATE INDEX IF NOT EXISTS entity_totals_top_type ON entity_totals (category_label, type, mentions);
+"""
+
+# Articles without a classification are counted under this category in entity_totals
+NO_CATEGORY = ""
+# Every article is also counted under this category, for corpus wide top-k queries
+ALL_CATEGORIES = "*"
+# Upper bound on the rows returned by lookup_entity and top_entities
+MAX_RESULTS = 1000
+
+_local = threading.local()
+
+
+def get_connection(path=None):
+    """Return a connection for the current thread, creating the schema on first use."""
+    path = path or DB_PATH
+    connections = getattr(_local, "connections", None)
+    if connections is None:
+        connections = _local.connections = {}
+    if path not in connections:
+        # Autocommit mode, so upsert_article controls when its transaction begins
+        conn = sqlite3.connect(path, isolation_level=None)
+        conn.row_factory = sqlite3.Row
+        conn.execute("PRAGMA journal_mode=WAL")
+        conn.execute("PRAGMA synchronous=NORMAL")
+        conn.execute("PRAGMA foreign_keys=ON")
+        conn.executescript(SCHEMA)
+        connections[path] = conn
+    return connections[path]
+
+
+def normalize_entity(text):
+    """Normalize entity text the same way the NER input is normalized."""
+    clean_text = dediac_ar(text)
+    clean_text = normalize_alef_ar(clean_text)
+    return " ".join(clean_text.split()).lower()
+
+
+def _merge_entities(entities):
+    """Merge entities that normalize to the same text and type."""
+    merged = {}
+    for entity in entities or []:
+        key = (normalize_entity(entity['text']), entity['type'])
+        if key not in merged:
+            merged[key] = {"text": entity['text'], "count": 0}
+        merged[key]["count"] += entity.get('count', 1)
+    return merged
+
+
+def _update_totals(conn, category, merged, sign):
+    """Add (sign=1) or remove (sign=-1) an article's entities from the running totals."""
+    for (norm_text, entity_type), details in merged.items():
+        for category_label in (category, ALL_CATEGORIES):
+            conn.execute(
+                """
+                INSERT INTO entity_totals (category_label, norm_text, type, text, mentions, articles)
+                VALUES (?, ?, ?, ?, ?, ?)
+                ON CONFLICT (category_label, type, norm_text) DO UPDATE SET
+                    mentions = mentions + excluded.mentions,
+                    articles = articles + excluded.articles
+                """,
+                (category_label, norm_text, entity_type, details["text"], sign * details["count"], sign),
+            )
+            if sign < 0:
+                conn.execute(
+                    """
+                    DELETE FROM entity_totals
+                    WHERE category_label = ? AND type = ? AND norm_text = ? AND articles <= 0
+                    """,
+                    (category_label, entity_type, norm_text),
+                )
+
+
+def upsert_article(url, entities=None, classification=None, datalayer=None,
+                   title=None, lastmod=None, conn=None):
+    """Store or replace the entities and metadata of one article.
+
+    Fields that are None keep their previously stored value, so a route that
+    only runs NER does not erase the classification stored by the crawler.
+    """
+    conn = conn or get_connection()
+    category_label = category_number = None
+    if classification:
+        category_label = classification[0].get('label')
+        category_number = classification[0].get('number')
+        if not isinstance(category_number, int):
+            category_number = None
+    if datalayer is not None and not (isinstance(datalayer, dict) and 'error' in datalayer):
+        datalayer = json.dumps(datalayer, ensure_ascii=False)
+    else:
+        datalayer = None
+
+    # BEGIN IMMEDIATE takes the write lock before the previous entities are read,
+    # so concurrent upserts cannot both subtract the same stale rows from the totals
+    conn.execute("BEGIN IMMEDIATE")
+    try:
+        article_id = _write_article(conn, url, title, category_label, category_number, datalayer, lastmod, entities)
+        conn.execute("COMMIT")
+    except BaseException:
+        conn.execute("ROLLBACK")
+        raise
+    return article_id
+
+
+def _write_article(conn, url, title, category_label, category_number, datalayer, lastmod, entities):
+    previous = conn.execute(
+        "SELECT id, category_label FROM articles WHERE url = ?", (url,)
+    ).fetchone()
+    old_rows = []
+    if previous:
+        old_rows = conn.execute(
+            "SELECT norm_text, type, text, count FROM entities WHERE article_id = ?",
+            (previous["id"],),
+        ).fetchall()
+
+    conn.execute(
+        """
+        INSERT INTO articles (url, title, category_label, category_number, datalayer, lastmod, processed_at)
+        VALUES (?, ?, ?, ?, ?, ?, ?)
+        ON CONFLICT (url) DO UPDATE SET
+            title = COALESCE(excluded.title, title),
+            category_label = COALESCE(excluded.category_label, category_label),
+            category_number = COALESCE(excluded.category_number, category_number),
+            datalayer = COALESCE(excluded.datalayer, datalayer),
+            lastmod = COALESCE(excluded.lastmod, lastmod),
+            processed_at = excluded.processed_at
+        """,
+        (url, title, category_label, category_number, datalayer, lastmod, time.time()),
+    )
+    article = conn.execute(
+        "SELECT id, category_label FROM articles WHERE url = ?", (url,)
+    ).fetchone()
+    old_category = previous["category_label"] if previous else None
+    new_category = article["category_label"]
+
+    if entities is None:
+        # Entities unchanged, but the totals may need to move to a new category
+        if not old_rows or old_category == new_category:
+            return article["id"]
+        new_merged = {
+            (row["norm_text"], row["type"]): {"text": row["text"], "count": row["count"]}
+            for row in old_rows
+        }
+    else:
+        new_merged = _merge_entities(entities)
+
+    if old_rows:
+        old_merged = {
+            (row["norm_text"], row["type"]): {"text": row["text"], "count": row["count"]}
+            for row in old_rows
+        }
+        _update_totals(conn, old_category or NO_CATEGORY, old_merged, -1)
+        conn.execute("DELETE FROM entities WHERE article_id = ?", (article["id"],))
+
+    conn.executemany(
+        "INSERT INTO entities (article_id, norm_text, type, text, count) VALUES (?, ?, ?, ?, ?)",
+        [
+            (article["id"], norm_text, entity_type, details["text"], details["count"])
+            for (norm_text, entity_type), details in new_merged.items()
+        ],
+    )
+    _update_totals(conn, new_category or NO_CATEGORY, new_merged, 1)
+
+    return article["id"]
+
+
+def clamp_limit(limit):
+    """Keep a requested row count between 1 and MAX_RESULTS."""
+    return max(1, min(int(limit), MAX_RESULTS))
+
+
+def lookup_entity(text, entity_type=None, since=None, limit=100, conn=None):
+    """Return the articles that mention an entity, most recently processed first."""
+    conn = conn or get_connection()
+    limit = clamp_limit(limit)
+    query = """
+        SELECT a.url, a.title, a.category_label, a.processed_at, e.type, e.count
+        FROM entities e JOIN articles a ON a.id = e.article_id
+        WHERE e.norm_text = ?
+    """
+    params = [normalize_entity(text)]
+    if entity_type:
+        query += " AND e.type = ?"
+        params.append(entity_type)
+    if since is not None:
+        query += " AND a.processed_at >= ?"
+        params.append(float(since))
+    query += " ORDER BY a.processed_at DESC LIMIT ?"
+    params.append(limit)
+    return [dict(row) for row in conn.execute(query, params)]
+
+
+def top_entities(entity_type=None, category=None, since=None, k=10, conn=None):
+    """Return the k most mentioned entities, optionally per type, category and time window.
+
+    Without a time window the answer comes from the pre-aggregated totals; with
+    one, the matching articles are aggregated on the fly.
+    """
+    conn = conn or get_connection()
+    k = clamp_limit(k)
+    params = []
+    if since is None:
+        query = """
+            SELECT text, type, mentions, articles
+            FROM entity_totals WHERE category_label = ?
+        """
+        params.append(category if category is not None else ALL_CATEGORIES)
+        if entity_type:
+            query += " AND type = ?"
+            params.append(entity_type)
+    else:
+        query = """
+            SELECT MIN(e.text) AS text, e.type, SUM(e.count) AS mentions, COUNT(*) AS articles
+            FROM articles a JOIN entities e ON e.article_id = a.id
+            WHERE a.processed_at >= ?
+        """
+        params.append(float(since))
+        if category is not None:
+            query += " AND a.category_label = ?"
+            params.append(category)
+        if entity_type:
+            query += " AND e.type = ?"
+            params.append(entity_type)
+        query += " GROUP BY e.type, e.norm_text"
+    query += " ORDER BY mentions DESC LIMIT ?"
+    params.append(k)
+    return [dict(row) for row in conn.execute(query, params)]
@@ -11,7 +11,7 @@ category_mapping = { 'Politics':1, 'Finance':2, 'Medical':3, 'Sports':4, 'Cultur
 max_length = 512
 
 
-def text_classification(main_texts):
+def text_classification(main_texts, max_time=None):
     # Tokenize the input texts with padding and truncation
     tokens=tokenizer(main_texts, max_length=max_length,
                     truncation=True,
@@ -21,32 +21,30 @@ def text_classification(main_texts):
 
     output= model.generate(tokens['input_ids'],
                         max_length=3,
+                        max_time=max_time,  # Stop generating once the time budget is spent
                         #length_penalty=10
                         )
 
-    decoded_output = tokenizer.decode(output[0], skip_special_tokens=True, clean_up_tokenization_spaces=True)
-
+    reverse_mapping = {v: k for k, v in category_mapping.items()}
     results = []
 
+    # Decode one prediction per input text
+    for generated in output:
+        decoded_output = tokenizer.decode(generated, skip_special_tokens=True, clean_up_tokenization_spaces=True)
 
-    # Convert the decoded output to an integer
-    try:
-        category_number = int(decoded_output)
-        # Reverse the category mapping to get the label
-        reverse_mapping = {v: k for k, v in category_mapping.items()}
-        category_label = reverse_mapping.get(category_number, "Unknown")
-        results = [
-            {
+        # Convert the decoded output to an integer
+        try:
+            category_number = int(decoded_output)
+            # Reverse the category mapping to get the label
+            category_label = reverse_mapping.get(category_number, "Unknown")
+            results.append({
                 'label': category_label,
                 'number': category_number
-            }
-        ]
-    except ValueError:
-        results = [
-            {
+            })
+        except ValueError:
+            results.append({
                 'label': 'N/A',
-                'number': category_number
-            }
-        ]
+                'number': decoded_output
+            })
 
     return results
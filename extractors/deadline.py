@@ -0,0 +1,48 @@
+import contextvars
+import os
+import time
+from requests.exceptions import Timeout
+
+# Header carrying the client's time budget for the request, in seconds
+DEADLINE_HEADER = "X-Request-Timeout"
+DEFAULT_TIMEOUT = float(os.environ.get("WAMS_REQUEST_TIMEOUT", 10))
+
+# Minimum remaining seconds a stage needs to be worth starting
+STAGE_BUDGETS = {
+    'parse': 0.2,
+    'ner': 0.5,
+    'classification': 0.5,
+    'summarization': 2.0,
+}
+
+_current = contextvars.ContextVar("deadline", default=None)
+
+
+class DeadlineExceeded(Timeout):
+    """Raised when the request's time budget runs out before a stage finishes."""
+
+
+class Deadline:
+    def __init__(self, seconds):
+        self.seconds = seconds
+        self.expires_at = time.monotonic() + seconds
+
+    def remaining(self):
+        return max(0.0, self.expires_at - time.monotonic())
+
+    def expired(self):
+        return self.remaining() <= 0
+
+    def allows(self, stage):
+        """Whether enough time remains to start the given stage."""
+        return self.remaining() > STAGE_BUDGETS.get(stage, 0)
+
+
+def set_deadline(deadline):
+    """Make the deadline visible to every stage running in the current context."""
+    _current.set(deadline)
+
+
+def get_deadline():
+    """Return the deadline of the current request, or None outside of a request."""
+    return _current.get()
@@ -1,10 +1,12 @@
-import requests
 from bs4 import BeautifulSoup
+from extractors.fetch import fetch_html
 
 def extract_external_links(url):
-    response = requests.get(url)
-    response.raise_for_status()  # Raises an error if the request was unsuccessful
-    soup = BeautifulSoup(response.text, 'html.parser')
+    html = fetch_html(url)  # Raises an error if the request was unsuccessful or rejected
+    soup = BeautifulSoup(html, 'html.parser')
+    return extract_links_from_soup(soup)
+
+def extract_links_from_soup(soup):
     links = []
 
     for link in soup.find_all('a', href=True):
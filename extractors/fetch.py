@@ -0,0 +1,169 @@
+import codecs
+import logging
+import os
+import re
+import socket
+import threading
+import requests
+from requests.exceptions import RequestException, Timeout, ConnectionError, ChunkedEncodingError
+from extractors.deadline import DeadlineExceeded, get_deadline
+
+# Maximum number of bytes read from a response body
+MAX_BYTES = int(os.environ.get("WAMS_MAX_BYTES", 5 * 1024 * 1024))
+CHUNK_SIZE = 64 * 1024
+# Smaller reads when a deadline is set, so the chunk loop checks it often
+DEADLINE_CHUNK_SIZE = 8 * 1024
+# Raw bytes buffered before choosing the charset, unless </head> arrives first
+SNIFF_BYTES = 2048
+# Characters of already received text kept in front of each new chunk for until()
+OVERLAP = 16 * 1024
+HTML_CONTENT_TYPES = ("text/html", "application/xhtml+xml")
+
+_meta_charset = re.compile(rb'<meta[^>]+charset=["\']?([\w-]+)', re.IGNORECASE)
+_datalayer_script = re.compile(r'dataLayer\.push\(.*?\);.*?</script>', re.DOTALL | re.IGNORECASE)
+
+
+class ContentRejected(RequestException):
+    """Raised when a response is not HTML or is larger than the byte cap."""
+
+
+def body_closed(html):
+    """Stop once the closing body tag has been received."""
+    return "</body>" in html.lower()
+
+
+def datalayer_seen(html):
+    """Stop once the script holding a complete dataLayer.push(...) call has been closed.
+
+    html.parser drops the contents of an unclosed <script>, so stopping right
+    after the push would lose the dataLayer.
+    """
+    return _datalayer_script.search(html) is not None
+
+
+def _sniff_encoding(response, head):
+    """Pick the charset from the headers, then from a meta tag, then fall back to UTF-8."""
+    if "charset" in response.headers.get("Content-Type", "").lower() and response.encoding:
+        return response.encoding
+    match = _meta_charset.search(head)
+    if match:
+        try:
+            return codecs.lookup(match.group(1).decode("ascii")).name
+        except LookupError:
+            pass
+    return "utf-8"
+
+
+def _socket_of(response):
+    """Return the socket a streamed requests response is reading from, if it can be found."""
+    connection = getattr(response.raw, "connection", None) or getattr(response.raw, "_connection", None)
+    sock = getattr(connection, "sock", None)
+    if sock is None:
+        # http.client hands the socket over to the response when the origin
+        # closes the connection after the body
+        fp = getattr(getattr(response.raw, "_fp", None), "fp", None)
+        sock = getattr(getattr(fp, "raw", None), "_sock", None)
+    return sock
+
+
+def _shutdown(sock, fired):
+    """Interrupt a read blocked on the socket once the deadline passes."""
+    fired.set()
+    try:
+        sock.shutdown(socket.SHUT_RDWR)
+    except OSError:
+        pass
+
+
+def fetch_html(url, session=None, max_bytes=None, until=None, timeout=30, deadline=None):
+    """Stream an HTML page in chunks and return the decoded text.
+
+    The content type and length are checked from the headers before any of the
+    body is downloaded, at most max_bytes are read, and the download stops early
+    as soon as until(window) returns True. The window holds the newly decoded
+    chunk plus the last OVERLAP characters before it, so markers split across
+    chunks are still found without rescanning the whole page.
+
+    When a deadline is given, or set for the current request, the connect and
+    read timeouts are capped at the remaining budget and the body is read in
+    DEADLINE_CHUNK_SIZE chunks, checking the deadline after each one. On top of
+    that, a watchdog shuts the socket down when the budget runs out, so an
+    origin trickling the body byte by byte cannot outlive the deadline either.
+    Finding the socket relies on urllib3 and http.client internals; if it cannot
+    be found a warning is logged and only the chunk loop enforces the deadline.
+    Timeouts and read errors after the deadline are raised as DeadlineExceeded.
+    """
+    max_bytes = MAX_BYTES if max_bytes is None else max_bytes
+    getter = session.get if session is not None else requests.get
+    deadline = deadline or get_deadline()
+    if deadline is not None:
+        if deadline.expired():
+            raise DeadlineExceeded(f"Deadline exceeded before fetching {url}")
+        timeout = min(timeout, deadline.remaining())
+
+    fired = threading.Event()
+    watchdog = None
+    try:
+        with getter(url, stream=True, timeout=timeout) as response:
+            response.raise_for_status()
+
+            chunk_size = CHUNK_SIZE
+            if deadline is not None:
+                chunk_size = DEADLINE_CHUNK_SIZE
+                sock = _socket_of(response)
+                if sock is not None:
+                    watchdog = threading.Timer(deadline.remaining(), _shutdown, (sock, fired))
+                    watchdog.daemon = True
+                    watchdog.start()
+                else:
+                    logging.warning(f"No socket found for {url}, the deadline is only checked between reads")
+
+            content_type = response.headers.get("Content-Type", "")
+            if content_type and content_type.split(";")[0].strip().lower() not in HTML_CONTENT_TYPES:
+                raise ContentRejected(f"Unsupported content type: {content_type}")
+
+            content_length = response.headers.get("Content-Length")
+            if content_length and content_length.isdigit() and int(content_length) > max_bytes:
+                raise ContentRejected(f"Response too large: {content_length} bytes (limit {max_bytes})")
+
+            decoder = None
+            head = bytearray()
+            parts = []
+            received = 0
+            for chunk in response.iter_content(chunk_size=chunk_size):
+                if deadline is not None and deadline.expired():
+                    raise DeadlineExceeded(f"Deadline exceeded while downloading {url}")
+                received += len(chunk)
+                if received > max_bytes:
+                    raise ContentRejected(f"Response exceeded {max_bytes} bytes")
+                if decoder is None:
+                    # Chunked responses can start with a few bytes only, so wait for
+                    # enough of the page to see a meta charset before decoding
+                    head += chunk
+                    if len(head) < SNIFF_BYTES and b"</head>" not in head.lower():
+                        continue
+                    decoder = codecs.getincrementaldecoder(_sniff_encoding(response, head))(errors="replace")
+                    chunk = bytes(head)
+                text = decoder.decode(chunk)
+                window = (parts[-1][-OVERLAP:] if parts else "") + text
+                parts.append(text)
+                if until is not None and until(window):
+                    break
+            if decoder is None:
+                # The whole page was shorter than SNIFF_BYTES
+                decoder = codecs.getincrementaldecoder(_sniff_encoding(response, head))(errors="replace")
+                parts.append(decoder.decode(bytes(head)))
+            parts.append(decoder.decode(b"", final=True))
+    except (Timeout, ConnectionError, ChunkedEncodingError) as e:
+        if deadline is not None and deadline.expired():
+            raise DeadlineExceeded(f"Deadline exceeded while downloading {url}") from e
+        raise
+    finally:
+        if watchdog is not None:
+            watchdog.cancel()
+
+    if fired.is_set():
+        # The shutdown can look like a clean end of a close-delimited body
+        raise DeadlineExceeded(f"Deadline exceeded while downloading {url}")
+
+    return "".join(parts)
@@ -12,21 +12,32 @@ max_length = 512
 
 
 def extract_enitites(main_text):
-    # Dediacritize and normalize the text
-    clean_text = process_text(main_text)
+    return extract_entities_batch([main_text])[0]
+
+def extract_entities_batch(main_texts):
+    # Dediacritize and normalize the texts
+    clean_texts = [process_text(text) for text in main_texts]
 
-    # Tokenize the text with truncation and padding
-    inputs = tokenizer(clean_text, truncation=True, padding='max_length', max_length=max_length, return_tensors="pt")
+    # Tokenize the whole batch with truncation and padding
+    inputs = tokenizer(clean_texts, truncation=True, padding='max_length', max_length=max_length, return_tensors="pt")
 
-    # Perform NER using the model
+    # Perform NER using the model, one forward pass for the batch
     with torch.no_grad():
         outputs = model(**inputs)
-    
+
     # Decode the outputs to get results
     logits = outputs.logits
-    predictions = torch.argmax(logits, dim=2).squeeze().tolist()
-    tokens = tokenizer.convert_ids_to_tokens(inputs['input_ids'].squeeze().tolist())
-    
+    batch_predictions = torch.argmax(logits, dim=2).tolist()
+    batch_input_ids = inputs['input_ids'].tolist()
+
+    return [
+        decode_entities(input_ids, predictions)
+        for input_ids, predictions in zip(batch_input_ids, batch_predictions)
+    ]
+
+def decode_entities(input_ids, predictions):
+    tokens = tokenizer.convert_ids_to_tokens(input_ids)
+
     # Convert predictions to entity tags
     ner_results = []
     word_start = 0  # Track the start position of each word in the text
@@ -35,13 +46,13 @@ def extract_enitites(main_text):
             word_len = len(token.replace('##', ''))  # Adjust word length without ##
             ner_results.append({'word': token, 'entity': model.config.id2label[tag], 'start': word_start, 'end': word_start + word_len})
             word_start += word_len
-    
+
     # Convert the results into a structured format
     entities = bio_to_entities(ner_results)
-        
+
     # Aggregate entities to show only one instance with counts
     aggregated_entities = aggregate_entities(entities)
-    
+
     return aggregated_entities
 
 def bio_to_entities(results):
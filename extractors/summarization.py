@@ -9,9 +9,10 @@ tokenizer = AutoTokenizer.from_pretrained(model_name)
 model = AutoModelForSeq2SeqLM.from_pretrained(model_name)
 
 max_length = 512
-def summarize_arabic(text):
+def summarize_arabic(text, max_time=None):
     inputs = tokenizer(text, return_tensors="pt", max_length=max_length, truncation=True)
-    summary_ids = model.generate(inputs.input_ids, max_length=max_length, min_length=60, length_penalty=2.0, num_beams=4, early_stopping=True)
+    # max_time stops the beam search once the time budget is spent
+    summary_ids = model.generate(inputs.input_ids, max_length=max_length, min_length=60, length_penalty=2.0, num_beams=4, early_stopping=True, max_time=max_time)
 
      # Convert the decoded output to an integer
     summary = []  
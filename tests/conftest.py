@@ -0,0 +1,84 @@
+import gzip
+import os
+import sys
+import threading
+import types
+from functools import partial
+from http.server import SimpleHTTPRequestHandler, ThreadingHTTPServer
+
+import pytest
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+SITE_DIR = os.path.join(ROOT, "tests", "fixtures", "site")
+# Fixture files use this host, replaced with the address of the local server when served
+FIXTURE_HOST = b"http://fixture.test"
+
+sys.path.insert(0, ROOT)
+
+
+def stub_entities_batch(main_texts):
+    return [[{"text": "دبي", "type": "LOC", "count": 1}] for _ in main_texts]
+
+
+def stub_classification(main_texts, max_time=None):
+    return [{"label": "Tech", "number": 6} for _ in main_texts]
+
+
+# The model modules load their weights at import time, so tests use stubs instead
+sys.modules.setdefault("extractors.ner", types.SimpleNamespace(extract_entities_batch=stub_entities_batch))
+sys.modules.setdefault("extractors.classifications", types.SimpleNamespace(text_classification=stub_classification))
+
+
+class FixtureHandler(SimpleHTTPRequestHandler):
+    """Serve the fixture site, pointing its absolute URLs at this server.
+
+    A request for name.xml.gz is answered with the gzipped name.xml.
+    """
+
+    def do_GET(self):
+        path = self.translate_path(self.path)
+        compress = path.endswith(".gz") and not os.path.exists(path)
+        if compress:
+            path = path[:-len(".gz")]
+        if not os.path.isfile(path):
+            self.send_error(404)
+            return
+
+        with open(path, "rb") as f:
+            body = f.read().replace(FIXTURE_HOST, self.server.base_url.encode())
+        if compress:
+            body = gzip.compress(body)
+            content_type = "application/gzip"
+        else:
+            content_type = self.guess_type(path)
+            if content_type == "text/html":
+                content_type += "; charset=utf-8"
+
+        self.send_response(200)
+        self.send_header("Content-Type", content_type)
+        self.send_header("Content-Length", str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def log_message(self, format, *args):
+        pass
+
+
+@pytest.fixture(scope="session")
+def site():
+    """Base URL of the fixture site served over HTTP."""
+    server = ThreadingHTTPServer(("127.0.0.1", 0), partial(FixtureHandler, directory=SITE_DIR))
+    server.base_url = f"http://127.0.0.1:{server.server_address[1]}"
+    thread = threading.Thread(target=server.serve_forever, daemon=True)
+    thread.start()
+    yield server.base_url
+    server.shutdown()
+
+
+@pytest.fixture
+def entity_db(tmp_path, monkeypatch):
+    import entity_store
+
+    path = str(tmp_path / "entities.db")
+    monkeypatch.setattr(entity_store, "DB_PATH", path)
+    return path
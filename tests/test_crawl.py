@@ -0,0 +1,140 @@
+import gzip
+import json
+import os
+
+import crawl
+
+
+def read_shards(output_dir):
+    records = []
+    for name in sorted(os.listdir(output_dir)):
+        if name.startswith("shard-"):
+            with gzip.open(os.path.join(output_dir, name), "rt", encoding="utf-8") as f:
+                records.extend(json.loads(line) for line in f)
+    return records
+
+
+def test_read_feed_sitemap_index_with_gzipped_sitemap(site):
+    entries = crawl.read_feed(f"{site}/sitemap_index.xml")
+
+    assert entries == [
+        (f"{site}/article-1.html", "2024-10-01"),
+        (f"{site}/article-2.html", "2024-10-02"),
+        (f"{site}/article-3.html", "2024-10-03"),
+    ]
+
+
+def test_read_feed_rss(site):
+    entries = crawl.read_feed(f"{site}/feed.xml")
+
+    assert entries == [
+        (f"{site}/article-2.html", "Wed, 02 Oct 2024 08:00:00 GMT"),
+        (f"{site}/article-3.html", "Thu, 03 Oct 2024 08:00:00 GMT"),
+    ]
+
+
+def test_read_feed_atom(site):
+    entries = crawl.read_feed(f"{site}/atom.xml")
+
+    assert entries == [(f"{site}/article-1.html", "2024-10-01T08:00:00Z")]
+
+
+def test_pending_entries_keeps_new_and_changed_urls():
+    seen = {"a": "1", "b": "1"}
+    entries = [("a", "1"), ("b", "2"), ("c", None), ("c", None)]
+
+    assert crawl.pending_entries(entries, seen) == [("b", "2"), ("c", None)]
+
+
+def test_save_checkpoint_round_trip(tmp_path):
+    path = str(tmp_path / "checkpoint.json")
+    crawl.save_checkpoint(path, {"http://example.com/مقال": "2024-10-01"})
+
+    assert crawl.load_checkpoint(path) == {"http://example.com/مقال": "2024-10-01"}
+    assert os.listdir(tmp_path) == ["checkpoint.json"]
+
+
+def test_shard_writer_splits_and_resumes_numbering(tmp_path):
+    writer = crawl.ShardWriter(str(tmp_path), shard_size=2)
+    writer.write([{"n": 1}, {"n": 2}, {"n": 3}])
+
+    resumed = crawl.ShardWriter(str(tmp_path), shard_size=2)
+    resumed.write([{"n": 4}])
+
+    assert sorted(os.listdir(tmp_path)) == ["shard-00000.jsonl.gz", "shard-00001.jsonl.gz", "shard-00002.jsonl.gz"]
+    assert [record["n"] for record in read_shards(str(tmp_path))] == [1, 2, 3, 4]
+
+
+def test_crawl_processes_only_new_or_changed_articles(site, tmp_path, entity_db):
+    output_dir = str(tmp_path / "out")
+    feeds = [f"{site}/sitemap_index.xml"]
+
+    assert crawl.crawl(feeds, output_dir, batch_size=2) == 3
+    records = read_shards(output_dir)
+    assert sorted(record["url"] for record in records) == [f"{site}/article-{i}.html" for i in (1, 2, 3)]
+    record = records[0]
+    assert "الذكاء الاصطناعي" in record["text"]
+    assert record["entities"] == [{"text": "دبي", "type": "LOC", "count": 1}]
+    assert record["classification"] == [{"label": "Tech", "number": 6}]
+    assert record["datalayer"]["section"] == "news"
+    assert record["external_links"] == [f"https://example.com/source-{record['url'][-6]}"]
+
+    # Nothing changed, so a second run only reads the feeds
+    assert crawl.crawl(feeds, output_dir) == 0
+
+    # A changed lastmod is picked up again
+    checkpoint_path = os.path.join(output_dir, crawl.CHECKPOINT_FILE)
+    seen = crawl.load_checkpoint(checkpoint_path)
+    seen[f"{site}/article-2.html"] = "2024-09-01"
+    crawl.save_checkpoint(checkpoint_path, seen)
+
+    assert crawl.crawl(feeds, output_dir) == 1
+    assert len(read_shards(output_dir)) == 4
+
+
+def test_crawl_retries_articles_whose_model_stage_failed(site, tmp_path, entity_db, monkeypatch):
+    output_dir = str(tmp_path / "out")
+    feeds = [f"{site}/feed.xml"]
+
+    def failing_batch(main_texts):
+        raise RuntimeError("model unavailable")
+
+    with monkeypatch.context() as m:
+        m.setattr(crawl, "extract_entities_batch", failing_batch)
+        assert crawl.crawl(feeds, output_dir) == 2
+
+    assert all("ner_error" in record for record in read_shards(output_dir))
+    assert crawl.load_checkpoint(os.path.join(output_dir, crawl.CHECKPOINT_FILE)) == {}
+
+    # Once the model is back, the same articles are processed again
+    assert crawl.crawl(feeds, output_dir) == 2
+    assert len(crawl.load_checkpoint(os.path.join(output_dir, crawl.CHECKPOINT_FILE))) == 2
+
+
+def test_read_feed_skips_broken_and_repeated_child_sitemaps(site):
+    entries = crawl.read_feed(f"{site}/broken_index.xml")
+
+    assert entries == [
+        (f"{site}/article-1.html", "2024-10-01"),
+        (f"{site}/article-2.html", "2024-10-02"),
+    ]
+
+
+def test_crawl_survives_a_corrupt_gzipped_feed(site, tmp_path, entity_db):
+    feeds = [f"{site}/corrupt.xml.gz", f"{site}/atom.xml"]
+
+    assert crawl.crawl(feeds, str(tmp_path / "out")) == 1
+
+
+def test_crawl_checkpoints_permanent_failures(site, tmp_path, entity_db):
+    output_dir = str(tmp_path / "out")
+    feeds = [f"{site}/sitemap-failures.xml"]
+
+    assert crawl.crawl(feeds, output_dir) == 3
+    errors = {record["url"]: record for record in read_shards(output_dir) if "error" in record}
+    assert set(errors) == {f"{site}/missing.html", f"{site}/notes.txt"}
+    assert all(record["permanent"] for record in errors.values())
+    assert len(crawl.load_checkpoint(os.path.join(output_dir, crawl.CHECKPOINT_FILE))) == 3
+
+    # 404s and non-HTML pages are not fetched again until their lastmod changes
+    assert crawl.crawl(feeds, output_dir) == 0
@@ -0,0 +1,62 @@
+import threading
+
+import entity_store
+
+
+def totals(category=entity_store.ALL_CATEGORIES):
+    conn = entity_store.get_connection()
+    return {
+        row["norm_text"]: row["mentions"]
+        for row in conn.execute("SELECT norm_text, mentions FROM entity_totals WHERE category_label = ?", (category,))
+    }
+
+
+def test_upsert_replaces_entities_and_moves_totals_between_categories(entity_db):
+    entity_store.upsert_article("a", [{"text": "دبي", "type": "LOC", "count": 3}],
+                                [{"label": "Politics", "number": 1}])
+    entity_store.upsert_article("b", [{"text": "دبي", "type": "LOC", "count": 2}])
+
+    assert totals() == {"دبي": 5}
+    assert totals("Politics") == {"دبي": 3}
+
+    entity_store.upsert_article("a", [{"text": "القاهرة", "type": "LOC", "count": 1}],
+                                [{"label": "Finance", "number": 2}])
+
+    assert totals() == {"دبي": 2, "القاهرة": 1}
+    assert totals("Politics") == {}
+    assert totals("Finance") == {"القاهرة": 1}
+    assert [row["url"] for row in entity_store.lookup_entity("دبي")] == ["b"]
+
+
+def test_concurrent_upserts_keep_totals_consistent(entity_db):
+    entity_store.upsert_article("other", [{"text": "دبي", "type": "LOC", "count": 5}])
+
+    def upsert(count):
+        for _ in range(100):
+            entity_store.upsert_article("same", [{"text": "دبي", "type": "LOC", "count": count}])
+
+    threads = [threading.Thread(target=upsert, args=(count,)) for count in (1, 2, 3, 4)]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+
+    conn = entity_store.get_connection()
+    stored = conn.execute("SELECT SUM(count) FROM entities").fetchone()[0]
+    assert totals() == {"دبي": stored}
+
+
+def test_limits_are_clamped(entity_db):
+    for i in range(3):
+        entity_store.upsert_article(f"u{i}", [{"text": f"e{i}", "type": "ORG", "count": 1}])
+
+    assert len(entity_store.top_entities(k=-1)) == 1
+    assert len(entity_store.top_entities(k=2)) == 2
+    assert len(entity_store.lookup_entity("e0", limit=0)) == 1
+
+
+def test_since_is_compared_as_a_timestamp(entity_db):
+    entity_store.upsert_article("a", [{"text": "دبي", "type": "LOC", "count": 1}])
+
+    assert len(entity_store.lookup_entity("دبي", since="0")) == 1
+    assert len(entity_store.top_entities(since="0")) == 1
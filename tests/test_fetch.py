@@ -0,0 +1,152 @@
+import threading
+import time
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+import pytest
+
+from extractors.deadline import Deadline, DeadlineExceeded
+from extractors.datalayer import extract_datalayer_from_url
+from extractors.fetch import ContentRejected, fetch_html, body_closed
+
+ARABIC_BODY = "<body><p>مرحبا بالعالم</p></body></html>"
+
+
+class ChunkedHandler(BaseHTTPRequestHandler):
+    """Serve pages with chunked transfer encoding, one chunk per list item."""
+
+    protocol_version = "HTTP/1.1"
+    pages = {
+        "/windows-1256": ("text/html", [
+            b"<html>",
+            b'<head><meta charset="windows-1256"></head>',
+            ARABIC_BODY.encode("windows-1256"),
+        ]),
+        "/binary": ("application/pdf", [b"%PDF-1.4"]),
+        "/large": ("text/html", [b"<html><body>" + b"x" * 4096] * 4),
+        # Large enough for the first chunk to be decoded on its own, and split
+        # between the end of the push and the closing script tag
+        "/datalayer-split": ("text/html", [
+            b"<html><head>" + b"<!-- padding -->" * 256 + b"<script>dataLayer.push({'section': 'news'});",
+            b"</script></head><body><p>text</p></body></html>",
+        ]),
+        "/trailing": ("text/html", [b"<html><body>" + b"a" * 4096 + b"</body>"] + [b"<!-- -->" * 4096] * 8),
+    }
+
+    def do_GET(self):
+        content_type, chunks = self.pages[self.path]
+        self.send_response(200)
+        self.send_header("Content-Type", content_type)
+        self.send_header("Transfer-Encoding", "chunked")
+        self.end_headers()
+        try:
+            for chunk in chunks:
+                self.wfile.write(b"%x\r\n%s\r\n" % (len(chunk), chunk))
+                self.wfile.flush()
+            self.wfile.write(b"0\r\n\r\n")
+        except (BrokenPipeError, ConnectionResetError):
+            pass
+
+    def log_message(self, format, *args):
+        pass
+
+
+@pytest.fixture(scope="module")
+def origin():
+    server = ThreadingHTTPServer(("127.0.0.1", 0), ChunkedHandler)
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    yield f"http://127.0.0.1:{server.server_address[1]}"
+    server.shutdown()
+
+
+def test_meta_charset_after_a_small_first_chunk(origin):
+    html = fetch_html(f"{origin}/windows-1256")
+
+    assert "مرحبا بالعالم" in html
+    assert "�" not in html
+
+
+def test_rejects_non_html_content_type(origin):
+    with pytest.raises(ContentRejected):
+        fetch_html(f"{origin}/binary")
+
+
+def test_rejects_body_over_the_byte_cap(origin):
+    with pytest.raises(ContentRejected):
+        fetch_html(f"{origin}/large", max_bytes=8192)
+
+
+def test_datalayer_split_before_closing_script_tag(origin):
+    assert extract_datalayer_from_url(f"{origin}/datalayer-split") == {"section": "news"}
+
+
+def test_stops_at_closing_body_tag(origin):
+    html = fetch_html(f"{origin}/trailing", until=body_closed)
+
+    assert html.endswith("</body>")
+
+
+class SlowHandler(BaseHTTPRequestHandler):
+    """An origin that is slow to send either its headers or its body."""
+
+    def do_GET(self):
+        if self.path == "/slow-headers":
+            time.sleep(3)
+        if self.path == "/steady":
+            self.send_response(200)
+            self.send_header("Content-Type", "text/html")
+            self.end_headers()
+            try:
+                for _ in range(20):
+                    self.wfile.write(b"x" * 8192)
+                    self.wfile.flush()
+                    time.sleep(0.3)
+            except (BrokenPipeError, ConnectionResetError):
+                pass
+            return
+        if self.path == "/trickle-keep-alive":
+            self.protocol_version = "HTTP/1.1"
+        self.send_response(200)
+        self.send_header("Content-Type", "text/html")
+        if self.path == "/trickle-keep-alive":
+            self.send_header("Content-Length", "100")
+        self.end_headers()
+        try:
+            for _ in range(100):
+                self.wfile.write(b"x")
+                self.wfile.flush()
+                time.sleep(0.2)
+        except (BrokenPipeError, ConnectionResetError):
+            pass
+
+    def log_message(self, format, *args):
+        pass
+
+
+@pytest.fixture(scope="module")
+def slow_origin():
+    server = ThreadingHTTPServer(("127.0.0.1", 0), SlowHandler)
+    server.daemon_threads = True
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    yield f"http://127.0.0.1:{server.server_address[1]}"
+    server.shutdown()
+
+
+@pytest.mark.parametrize("path", ["/trickle", "/trickle-keep-alive", "/slow-headers"])
+def test_deadline_is_a_hard_limit(slow_origin, path):
+    started = time.monotonic()
+    with pytest.raises(DeadlineExceeded):
+        fetch_html(f"{slow_origin}{path}", deadline=Deadline(1.0))
+
+    assert time.monotonic() - started < 1.5
+
+
+def test_deadline_is_checked_between_reads_without_the_watchdog(slow_origin, monkeypatch, caplog):
+    import extractors.fetch
+
+    monkeypatch.setattr(extractors.fetch, "_socket_of", lambda response: None)
+    started = time.monotonic()
+    with pytest.raises(DeadlineExceeded):
+        fetch_html(f"{slow_origin}/steady", deadline=Deadline(1.0))
+
+    assert time.monotonic() - started < 1.8
+    assert "No socket found" in caplog.text